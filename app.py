@@ -4,7 +4,13 @@ import plotly.express as px
 from datetime import datetime, date
 import calendar
 import time
+import threading
 from streamlit_gsheets import GSheetsConnection
+from budget_engine import (
+    T_COLS, C_COLS, B_COLS, clean_transactions, clean_categories, clean_budgets,
+    planned_for_month, month_actuals, net_totals, category_diff,
+    LedgerAggregates, monthly_trends, yoy_by_category, budget_adherence,
+)
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Petersen Budget", page_icon="💰", layout="centered")
@@ -135,60 +141,26 @@ if not st.session_state["authenticated"]:
 # --- DATA ENGINE ---
 conn = st.connection("gsheets", type=GSheetsConnection)
 
-def safe_float(val):
-    try:
-        if isinstance(val, (int, float)): return float(val)
-        if isinstance(val, str):
-            clean = val.replace('$', '').replace(',', '').strip()
-            return float(clean) if clean else 0.0
-        return 0.0
-    except: return 0.0
-
 def load_data_clean():
     st.cache_data.clear()
     try:
-        t_df = conn.read(worksheet="transactions", ttl=0)
-        c_df = conn.read(worksheet="categories", ttl=0)
-        
-        # Transactions Clean
-        if t_df is not None and not t_df.empty:
-            t_df.columns = [str(c).strip().title() for c in t_df.columns]
-            for col in ["Date", "Type", "Category", "Amount", "User", "Memo"]:
-                if col not in t_df.columns: t_df[col] = ""
-            t_df["Amount"] = t_df["Amount"].apply(safe_float)
-            t_df['Date'] = pd.to_datetime(t_df['Date'], errors='coerce')
-            t_df = t_df.dropna(subset=['Date']).reset_index(drop=True)
-        else: t_df = pd.DataFrame(columns=["Date", "Type", "Category", "Amount", "User", "Memo"])
-        
-        # Categories Clean
-        if c_df is not None and not c_df.empty:
-            c_df.columns = [str(c).strip().title() for c in c_df.columns]
-            for col in ["Type", "Name", "Order", "Color"]:
-                if col not in c_df.columns: 
-                    if col == "Order": c_df[col] = 10
-                    elif col == "Color": c_df[col] = "#4682B4"
-                    else: c_df[col] = ""
-            c_df["Order"] = pd.to_numeric(c_df["Order"], errors='coerce').fillna(10)
-        else:
-            c_df = pd.DataFrame(columns=["Type", "Name", "Order", "Color"])
-            
-        # Budgets Clean
-        try:
-            b_df = conn.read(worksheet="budgets", ttl=0)
-            if b_df is not None and not b_df.empty:
-                b_df.columns = [str(c).strip().title() for c in b_df.columns]
-                for col in ["Month", "Category", "Amount"]:
-                    if col not in b_df.columns: b_df[col] = ""
-                b_df["Amount"] = b_df["Amount"].apply(safe_float)
-                b_df["Month"] = b_df["Month"].astype(str)
-            else: b_df = pd.DataFrame(columns=["Month", "Category", "Amount"])
-        except: b_df = pd.DataFrame(columns=["Month", "Category", "Amount"])
-            
+        t_df = clean_transactions(conn.read(worksheet="transactions", ttl=0))
+        c_df = clean_categories(conn.read(worksheet="categories", ttl=0))
+        try: b_df = clean_budgets(conn.read(worksheet="budgets", ttl=0))
+        except: b_df = pd.DataFrame(columns=B_COLS)
         return t_df, c_df, b_df
-    except: return pd.DataFrame(columns=["Date", "Type", "Category", "Amount", "User", "Memo"]), pd.DataFrame(columns=["Type", "Name", "Order", "Color"]), pd.DataFrame(columns=["Month", "Category", "Amount"])
+    except: return pd.DataFrame(columns=T_COLS), pd.DataFrame(columns=C_COLS), pd.DataFrame(columns=B_COLS)
 
 df_t, df_c, df_b = load_data_clean()
 
+# One aggregate store per spreadsheet for the whole server, so new sessions don't rebuild it from raw rows
+@st.cache_resource
+def shared_ledger_aggs(sheet):
+    return LedgerAggregates(), threading.Lock()
+
+try: sheet_key = str(st.secrets["connections"]["gsheets"].get("spreadsheet", "default"))
+except: sheet_key = "default"
+
 # Force 'Date' into datetime format globally
 df_t['Date'] = pd.to_datetime(df_t['Date'], errors='coerce')
 
@@ -389,29 +361,17 @@ with tab_budget:
     month_str = f"{selected_year}-{month_num:02d}"
     
     # Use the globally clean df_t
-    t_month = df_t[(df_t['Date'].dt.year == selected_year) & (df_t['Date'].dt.month == month_num)]
-    actuals = t_month.groupby('Category')['Amount'].sum().to_dict()
-    
-    b_month = df_b[df_b['Month'] == month_str] if not df_b.empty else pd.DataFrame(columns=["Month", "Category", "Amount"])
+    actuals = month_actuals(df_t, selected_year, month_num)
     
     # BUDGET ROLLOVER
-    if b_month.empty and not df_b.empty:
-        valid_months = df_b['Month'].dropna().astype(str).tolist()
-        if valid_months:
-            recent_month = max(valid_months)
-            recent_b = df_b[df_b['Month'] == recent_month]
-            planned = recent_b.set_index('Category')['Amount'].to_dict()
-            st.info(f"💡 **New Month!** Pre-filled with budget data from **{recent_month}**. Click 'Save Budget Planner' below to lock it in.")
-        else:
-            planned = {}
-    else:
-        planned = b_month.set_index('Category')['Amount'].to_dict() if not b_month.empty else {}
+    planned, rolled_from = planned_for_month(df_b, month_str)
+    if rolled_from:
+        st.info(f"💡 **New Month!** Pre-filled with budget data from **{rolled_from}**. Click 'Save Budget Planner' below to lock it in.")
     
     # Calculate global Net Totals (Ignoring headers)
-    tot_inc_p = sum(float(planned.get(c, 0.0)) for c in df_c[df_c["Type"] == "Income"]["Name"])
-    tot_inc_a = sum(float(actuals.get(c, 0.0)) for c in df_c[df_c["Type"] == "Income"]["Name"])
-    tot_exp_p = sum(float(planned.get(c, 0.0)) for c in df_c[df_c["Type"] == "Expense"]["Name"])
-    tot_exp_a = sum(float(actuals.get(c, 0.0)) for c in df_c[df_c["Type"] == "Expense"]["Name"])
+    totals = net_totals(df_c, planned, actuals)
+    tot_inc_p, tot_inc_a = totals["Income Planned"], totals["Income Actual"]
+    tot_exp_p, tot_exp_a = totals["Expense Planned"], totals["Expense Actual"]
     
     st.markdown("### Net Balance")
     nc1, nc2, nc3 = st.columns(3)
@@ -461,7 +421,7 @@ with tab_budget:
                     o = item["Order"]
                     p = float(planned.get(c, 0.0))
                     a = float(actuals.get(c, 0.0))
-                    diff = float(a - p) if base_type == "Income" else float(p - a)
+                    diff = category_diff(base_type, p, a)
                     data.append({"Order": o, "Category": c, "Planned": p, "Actual": a, "Diff": diff})
                 
                 df_to_edit = pd.DataFrame(data)
@@ -572,11 +532,17 @@ with tab_budget:
                         st.rerun()
 
 with tab2:
+    # Monthly aggregates are shared by every session and only fold in rows that changed since the last sync
+    shared_aggs, aggs_lock = shared_ledger_aggs(sheet_key)
+    with aggs_lock:
+        # An empty read (sheet error) would otherwise wipe the store and force a full rebuild
+        if not df_t.empty: shared_aggs.sync(df_t)
+        aggs = shared_aggs.snapshot()
+    
     if not df_t.empty:
         viz_df = df_t.copy()
         viz_df["Memo"] = viz_df["Memo"].apply(lambda x: "Unspecified" if str(x).lower() == "nan" or str(x).strip() == "" else str(x))
-        inc_val = viz_df[viz_df["Type"] == "Income"]["Amount"].sum()
-        exp_val = viz_df[viz_df["Type"] == "Expense"]["Amount"].sum()
+        inc_val, exp_val = aggs.net()
         st.metric("All-Time Net Balance", f"${(inc_val - exp_val):,.0f}", delta=f"${inc_val:,.0f} In")
         c1, c2 = st.columns(2)
         with c1:
@@ -589,6 +555,69 @@ with tab2:
             if not di.empty:
                 fig_in = px.sunburst(di, path=['Category', 'Memo'], values='Amount', title="Income Breakdown")
                 st.plotly_chart(fig_in, use_container_width=True)
+        
+        # --- TRENDS ---
+        st.divider()
+        st.markdown("### 📈 Trends")
+        trends = monthly_trends(aggs)
+        
+        tc1, tc2 = st.columns(2)
+        span = tc1.selectbox("Show", ["Last 12 Months", "Last 3 Years", "All Time"], index=1)
+        smooth = tc2.radio("Average", ["Monthly", "3-Month", "12-Month"], horizontal=True)
+        span_n = {"Last 12 Months": 12, "Last 3 Years": 36, "All Time": len(trends)}[span]
+        t_view = trends.tail(span_n)
+        suffix = {"Monthly": "", "3-Month": " 3M Avg", "12-Month": " 12M Avg"}[smooth]
+        series = [f"{c}{suffix}" for c in ["Income", "Expense", "Net"]]
+        fig_tr = px.line(t_view, x="Month", y=series, markers=True, title="Income, Expenses & Net",
+                         color_discrete_sequence=["#2e7d32", "#d32f2f", "#4682B4"])
+        fig_tr.update_layout(legend_title_text="", yaxis_title="$")
+        st.plotly_chart(fig_tr, use_container_width=True)
+        
+        st.markdown("#### Year over Year")
+        yc1, yc2 = st.columns(2)
+        yoy_years = sorted({int(m[:4]) for m in trends["Month"]}, reverse=True)
+        yoy_year = yc1.selectbox("Year", yoy_years)
+        yoy_type = yc2.radio("Type", ["Expense", "Income"], horizontal=True, key="yoy_type")
+        yoy, yoy_through = yoy_by_category(aggs, yoy_year, yoy_type)
+        if yoy.empty: st.caption("Nothing recorded for this year.")
+        else:
+            yoy_span = "" if yoy_through == 12 else f" (Jan–{calendar.month_abbr[yoy_through]} YTD)"
+            fig_yoy = px.bar(yoy, x="Category", y=[str(yoy_year - 1), str(yoy_year)], barmode="group",
+                             title=f"{yoy_type} by Category: {yoy_year - 1} vs {yoy_year}{yoy_span}")
+            fig_yoy.update_layout(legend_title_text="", yaxis_title="$")
+            st.plotly_chart(fig_yoy, use_container_width=True)
+            st.dataframe(yoy, hide_index=True, use_container_width=True, column_config={
+                str(yoy_year - 1): st.column_config.NumberColumn(format="$%d"),
+                str(yoy_year): st.column_config.NumberColumn(format="$%d"),
+                "Change": st.column_config.NumberColumn(format="$%d"),
+                "Change %": st.column_config.NumberColumn(format="%.0f%%"),
+            })
+        
+        st.markdown("#### Budget Adherence")
+        adh = budget_adherence(aggs, df_b, df_c)
+        if adh.empty: st.caption("Save a budget in the Budget tab to start tracking adherence.")
+        else:
+            fig_adh = px.bar(adh, x="Month", y=["Expense Planned", "Expense Actual"], barmode="group",
+                             title="Planned vs Actual Spending", color_discrete_sequence=["#4682B4", "#d32f2f"])
+            fig_adh.update_layout(legend_title_text="", yaxis_title="$")
+            st.plotly_chart(fig_adh, use_container_width=True)
+            on_budget = (adh["Expense Actual"] <= adh["Expense Planned"]).sum()
+            st.caption(f"Spending stayed within budget in **{on_budget} of {len(adh)}** budgeted months.")
+
+            fig_net = px.line(adh, x="Month", y=["Planned Net", "Actual Net"], markers=True,
+                              title="Planned vs Actual Net", color_discrete_sequence=["#4682B4", "#2e7d32"])
+            fig_net.update_layout(legend_title_text="", yaxis_title="$")
+            st.plotly_chart(fig_net, use_container_width=True)
+
+            adh_view = adh.sort_values("Month", ascending=False)
+            st.dataframe(adh_view, hide_index=True, use_container_width=True, column_config={
+                "Expense Planned": st.column_config.NumberColumn(format="$%d"),
+                "Expense Actual": st.column_config.NumberColumn(format="$%d"),
+                "Adherence %": st.column_config.ProgressColumn("Spent of Budget", format="%.0f%%", min_value=0,
+                                                              max_value=max(100.0, float(adh["Adherence %"].fillna(0).max()))),
+                "Planned Net": st.column_config.NumberColumn(format="$%d"),
+                "Actual Net": st.column_config.NumberColumn(format="$%d"),
+            })
     else: st.info("No data yet.")
 
 with tab3:
@@ -0,0 +1,212 @@
+import pandas as pd
+
+# Shared load/clean + budget math, used by the Streamlit app and the headless report CLI.
+# Nothing in here may import streamlit.
+
+T_COLS = ["Date", "Type", "Category", "Amount", "User", "Memo"]
+C_COLS = ["Type", "Name", "Order", "Color"]
+B_COLS = ["Month", "Category", "Amount"]
+
+def safe_float(val):
+    try:
+        if isinstance(val, (int, float)): return float(val)
+        if isinstance(val, str):
+            clean = val.replace('$', '').replace(',', '').strip()
+            return float(clean) if clean else 0.0
+        return 0.0
+    except: return 0.0
+
+# --- CLEANERS ---
+def clean_transactions(t_df):
+    if t_df is not None and not t_df.empty:
+        t_df.columns = [str(c).strip().title() for c in t_df.columns]
+        for col in T_COLS:
+            if col not in t_df.columns: t_df[col] = ""
+        t_df["Amount"] = t_df["Amount"].apply(safe_float)
+        t_df['Date'] = pd.to_datetime(t_df['Date'], errors='coerce')
+        return t_df.dropna(subset=['Date']).reset_index(drop=True)
+    return pd.DataFrame(columns=T_COLS).astype({"Date": "datetime64[ns]", "Amount": float})
+
+def clean_categories(c_df):
+    if c_df is not None and not c_df.empty:
+        c_df.columns = [str(c).strip().title() for c in c_df.columns]
+        for col in C_COLS:
+            if col not in c_df.columns:
+                if col == "Order": c_df[col] = 10
+                elif col == "Color": c_df[col] = "#4682B4"
+                else: c_df[col] = ""
+        c_df["Order"] = pd.to_numeric(c_df["Order"], errors='coerce').fillna(10)
+        return c_df
+    return pd.DataFrame(columns=C_COLS)
+
+def clean_budgets(b_df):
+    if b_df is not None and not b_df.empty:
+        b_df.columns = [str(c).strip().title() for c in b_df.columns]
+        for col in B_COLS:
+            if col not in b_df.columns: b_df[col] = ""
+        b_df["Amount"] = b_df["Amount"].apply(safe_float)
+        b_df["Month"] = b_df["Month"].astype(str)
+        return b_df
+    return pd.DataFrame(columns=B_COLS)
+
+# --- BUDGET MATH ---
+def planned_for_month(df_b, month_str, roll_forward=False):
+    # BUDGET ROLLOVER: a month with no saved budget borrows the most recent saved month.
+    # roll_forward=True only borrows from months <= month_str (backfills must not see future plans).
+    # Returns (planned dict, month it was rolled over from or None).
+    b_month = df_b[df_b['Month'] == month_str] if not df_b.empty else pd.DataFrame(columns=B_COLS)
+    if b_month.empty and not df_b.empty:
+        valid_months = df_b['Month'].dropna().astype(str).tolist()
+        if roll_forward: valid_months = [m for m in valid_months if m <= month_str]
+        if valid_months:
+            recent_month = max(valid_months)
+            recent_b = df_b[df_b['Month'] == recent_month]
+            return recent_b.set_index('Category')['Amount'].to_dict(), recent_month
+        return {}, None
+    return (b_month.set_index('Category')['Amount'].to_dict() if not b_month.empty else {}), None
+
+def month_actuals(df_t, year, month_num):
+    t_month = df_t[(df_t['Date'].dt.year == year) & (df_t['Date'].dt.month == month_num)]
+    return t_month.groupby('Category')['Amount'].sum().to_dict()
+
+def net_totals(df_c, planned, actuals):
+    # Global Net Totals (Ignoring headers)
+    inc = df_c[df_c["Type"] == "Income"]["Name"]
+    exp = df_c[df_c["Type"] == "Expense"]["Name"]
+    return {
+        "Income Planned": sum(float(planned.get(c, 0.0)) for c in inc),
+        "Income Actual": sum(float(actuals.get(c, 0.0)) for c in inc),
+        "Expense Planned": sum(float(planned.get(c, 0.0)) for c in exp),
+        "Expense Actual": sum(float(actuals.get(c, 0.0)) for c in exp),
+    }
+
+def category_diff(base_type, planned_amt, actual_amt):
+    # Positive = good: income over plan, expense under plan
+    return float(actual_amt - planned_amt) if base_type == "Income" else float(planned_amt - actual_amt)
+
+def budget_rows(df_c, base_type, planned, actuals):
+    # Same walk as the Budget tab: categories sorted by Order, grouped under the heading above them
+    items = df_c[df_c["Type"].isin([base_type, f"{base_type} Header"])].sort_values(by=["Order", "Name"])
+    rows, heading = [], ""
+    for _, item in items.iterrows():
+        if item["Type"] == f"{base_type} Header":
+            heading = item["Name"]
+            continue
+        c = item["Name"]
+        p = float(planned.get(c, 0.0))
+        a = float(actuals.get(c, 0.0))
+        rows.append({"Type": base_type, "Heading": heading, "Order": item["Order"], "Category": c,
+                     "Planned": p, "Actual": a, "Diff": category_diff(base_type, p, a)})
+    return rows
+
+# --- TREND AGGREGATES ---
+class LedgerAggregates:
+    # Running Month x Type x Category totals. sync() diffs the ledger against the rows it has
+    # already counted (by row hash) and only folds in the added/removed rows, so reruns and
+    # single edits never regroup the whole history.
+    def __init__(self):
+        self.totals = {}    # (month, type, category) -> amount
+        self.counts = {}    # (month, type, category) -> row count
+        self.version = 0
+        self._seen = pd.Series(dtype="int64")  # row hash -> copies counted
+        self._keys = {}     # row hash -> (month, type, category, amount)
+
+    def sync(self, df_t):
+        if df_t.empty: hashes = pd.Series(dtype="uint64")
+        else: hashes = pd.util.hash_pandas_object(df_t[T_COLS], index=False)
+        seen = hashes.value_counts()
+        delta = seen.sub(self._seen, fill_value=0).astype("int64")
+        delta = delta[delta != 0]
+        if delta.empty: return False
+
+        added = delta[delta > 0]
+        if not added.empty:
+            new = df_t.loc[hashes.isin(added.index).values, ["Date", "Type", "Category", "Amount"]]
+            new = new.assign(Hash=hashes[hashes.isin(added.index)].values).drop_duplicates("Hash")
+            months = new["Date"].dt.strftime('%Y-%m')
+            for h, m, t, c, a in zip(new["Hash"], months, new["Type"], new["Category"], new["Amount"]):
+                self._keys[h] = (m, str(t), str(c), float(a))
+        changes = pd.DataFrame([self._keys[h] for h in delta.index], columns=["Month", "Type", "Category", "Amount"])
+        changes["Amount"] *= delta.values
+        changes["N"] = delta.values
+        for key, a, n in changes.groupby(["Month", "Type", "Category"])[["Amount", "N"]].sum().itertuples(name=None):
+            self.totals[key] = self.totals.get(key, 0.0) + a
+            self.counts[key] = self.counts.get(key, 0) + n
+            if self.counts[key] <= 0:
+                del self.totals[key], self.counts[key]
+        for h in delta[delta < 0].index:
+            if h not in seen.index: del self._keys[h]
+
+        self._seen = seen
+        self.version += 1
+        return True
+
+    def snapshot(self):
+        # Copy of the totals only (small), for reading while another session syncs the original
+        snap = LedgerAggregates()
+        snap.totals, snap.counts, snap.version = dict(self.totals), dict(self.counts), self.version
+        return snap
+
+    def frame(self):
+        return pd.DataFrame([(m, t, c, a) for (m, t, c), a in self.totals.items()],
+                            columns=["Month", "Type", "Category", "Amount"])
+
+    def month_actuals(self, month_str):
+        out = {}
+        for (m, _, c), a in self.totals.items():
+            if m == month_str: out[c] = out.get(c, 0.0) + a
+        return out
+
+    def net(self):
+        inc = sum(a for (_, t, _), a in self.totals.items() if t == "Income")
+        exp = sum(a for (_, t, _), a in self.totals.items() if t == "Expense")
+        return inc, exp
+
+def monthly_trends(aggs):
+    # Income / Expense / Net per month (gaps filled with 0) plus rolling 3- and 12-month averages
+    agg = aggs.frame()
+    cols = ["Income", "Expense", "Net"]
+    if agg.empty: return pd.DataFrame(columns=["Month"] + cols)
+    by_month = agg.pivot_table(index="Month", columns="Type", values="Amount", aggfunc="sum")
+    by_month.index = pd.PeriodIndex(by_month.index, freq="M")
+    by_month = by_month.reindex(pd.period_range(by_month.index.min(), by_month.index.max(), freq="M"))
+    out = pd.DataFrame({c: by_month.get(c, pd.Series(0.0, index=by_month.index)) for c in cols[:2]}).fillna(0.0)
+    out["Net"] = out["Income"] - out["Expense"]
+    for c in cols:
+        out[f"{c} 3M Avg"] = out[c].rolling(3, min_periods=1).mean()
+        out[f"{c} 12M Avg"] = out[c].rolling(12, min_periods=1).mean()
+    out.index = out.index.astype(str)
+    return out.rename_axis("Month").reset_index()
+
+def yoy_by_category(aggs, year, base_type):
+    # One row per category: `year` vs the year before, over the same months. A partial year is
+    # compared year-to-date: both years stop at the last month recorded in `year`.
+    # Returns (frame, last month number included).
+    agg = aggs.frame()
+    cur, prev = str(year), str(year - 1)
+    cols = ["Category", prev, cur, "Change", "Change %"]
+    cur_months = agg["Month"][agg["Month"].str[:4] == cur] if not agg.empty else agg["Month"]
+    if cur_months.empty: return pd.DataFrame(columns=cols), 12
+    through = int(cur_months.max()[5:7])
+    agg = agg[agg["Type"] == base_type].assign(Year=agg["Month"].str[:4])
+    agg = agg[agg["Year"].isin([cur, prev]) & (agg["Month"].str[5:7].astype(int) <= through)]
+    out = agg.pivot_table(index="Category", columns="Year", values="Amount", aggfunc="sum")
+    out = out.reindex(columns=[prev, cur]).fillna(0.0).rename_axis(columns=None)
+    out["Change"] = out[cur] - out[prev]
+    out["Change %"] = (out["Change"] / out[prev].where(out[prev] != 0)) * 100
+    return out.sort_values(cur, ascending=False).reset_index(), through
+
+def budget_adherence(aggs, df_b, df_c):
+    # Planned vs actual for every month that has a saved budget (no rollover back-fill)
+    cols = ["Month", "Expense Planned", "Expense Actual", "Adherence %", "Planned Net", "Actual Net"]
+    if df_b.empty: return pd.DataFrame(columns=cols)
+    rows = []
+    for month_str, b_month in df_b[df_b["Month"].str.match(r"^\d{4}-\d{2}$")].groupby("Month"):
+        planned = b_month.set_index('Category')['Amount'].to_dict()
+        totals = net_totals(df_c, planned, aggs.month_actuals(month_str))
+        exp_p, exp_a = totals["Expense Planned"], totals["Expense Actual"]
+        rows.append({"Month": month_str, "Expense Planned": exp_p, "Expense Actual": exp_a,
+                     "Adherence %": (exp_a / exp_p * 100) if exp_p else None,
+                     "Planned Net": totals["Income Planned"] - exp_p,
+                     "Actual Net": totals["Income Actual"] - exp_a})
+    return pd.DataFrame(rows, columns=cols)
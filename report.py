@@ -0,0 +1,124 @@
+"""Headless budget-vs-actual reports, run offline against a snapshot of the sheets.
+
+    python report.py SNAPSHOT --start 2024-01 --end 2024-12 --out reports --format csv
+
+SNAPSHOT is either a folder holding transactions.csv, categories.csv and budgets.csv,
+or an .xlsx export of the Google Sheet (worksheets with the same names).
+Each month uses the Budget tab's variance rules; a month with no saved budget borrows the
+latest budget saved on or before it (never a later one).
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from budget_engine import (
+    clean_transactions, clean_categories, clean_budgets,
+    planned_for_month, month_actuals, net_totals, budget_rows,
+)
+
+SHEETS = ["transactions", "categories", "budgets"]
+
+# --- SNAPSHOT ---
+def load_snapshot(path):
+    if os.path.isdir(path):
+        raw = {}
+        for name in SHEETS:
+            f = os.path.join(path, f"{name}.csv")
+            raw[name] = pd.read_csv(f) if os.path.exists(f) else None
+    else:
+        book = pd.read_excel(path, sheet_name=None)
+        raw = {name: book.get(name) for name in SHEETS}
+    return clean_transactions(raw["transactions"]), clean_categories(raw["categories"]), clean_budgets(raw["budgets"])
+
+# --- WORKERS ---
+# Categories and budgets are small and shared by every month, so each worker gets them once.
+_df_c, _df_b = None, None
+
+def _init_worker(df_c, df_b):
+    global _df_c, _df_b
+    _df_c, _df_b = df_c, df_b
+
+def month_report(month_str, t_month):
+    year, month_num = int(month_str[:4]), int(month_str[5:7])
+    actuals = month_actuals(t_month, year, month_num)
+    planned, rolled_from = planned_for_month(_df_b, month_str, roll_forward=True)
+    totals = net_totals(_df_c, planned, actuals)
+    planned_net = totals["Income Planned"] - totals["Expense Planned"]
+    actual_net = totals["Income Actual"] - totals["Expense Actual"]
+    pnl = {"Month": month_str, **totals, "Planned Net": planned_net, "Actual Net": actual_net,
+           "Variance": actual_net - planned_net, "Budget From": rolled_from or (month_str if planned else "")}
+    rows = budget_rows(_df_c, "Income", planned, actuals) + budget_rows(_df_c, "Expense", planned, actuals)
+    for r in rows: r["Month"] = month_str
+    return pnl, rows
+
+def _year_report_task(tasks):
+    return [month_report(*t) for t in tasks]
+
+def run_months(df_t, df_c, df_b, months, workers):
+    by_month = {str(p): g for p, g in df_t.groupby(df_t["Date"].dt.to_period("M"))}
+    empty = clean_transactions(None)
+    tasks = [(m, by_month.get(m, empty)) for m in months]
+    # A single month is a tiny groupby, so workers get a whole year per task to amortise process startup
+    years = {}
+    for t in tasks: years.setdefault(t[0][:4], []).append(t)
+    workers = min(workers, len(years))
+    if workers <= 1:
+        _init_worker(df_c, df_b)
+        return [month_report(*t) for t in tasks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(df_c, df_b)) as pool:
+        return [r for chunk in pool.map(_year_report_task, years.values()) for r in chunk]
+
+# --- SUMMARIES ---
+def build_reports(results):
+    pnl = pd.DataFrame([p for p, _ in results])
+    variance = pd.DataFrame([r for _, rows in results for r in rows],
+                            columns=["Month", "Type", "Heading", "Order", "Category", "Planned", "Actual", "Diff"])
+    headings = variance.groupby(["Month", "Type", "Heading"], sort=False)[["Planned", "Actual", "Diff"]].sum().reset_index()
+    num_cols = [c for c in pnl.columns if c not in ("Month", "Budget From")]
+    yearly = pnl.assign(Year=pnl["Month"].str[:4]).groupby("Year")[num_cols].sum().reset_index()
+    return {"pnl": pnl, "variance": variance, "headings": headings, "yearly": yearly}
+
+def write_reports(reports, out_dir, fmt):
+    os.makedirs(out_dir, exist_ok=True)
+    for name, df in reports.items():
+        f = os.path.join(out_dir, f"{name}.{fmt}")
+        if fmt == "csv": df.to_csv(f, index=False)
+        elif fmt == "parquet": df.to_parquet(f, index=False)
+        else: df.to_html(f, index=False, float_format=lambda v: f"{v:,.0f}")
+        print(f"Wrote {f} ({len(df)} rows)")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Petersen Budget batch reports")
+    ap.add_argument("snapshot", help="folder of sheet CSVs or an .xlsx export")
+    ap.add_argument("--start", help="first month, YYYY-MM (default: earliest transaction)")
+    ap.add_argument("--end", help="last month, YYYY-MM (default: latest transaction)")
+    ap.add_argument("--out", default="reports", help="output folder")
+    ap.add_argument("--format", choices=["csv", "parquet", "html"], default="csv")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="processes to spread years across; worth it for long, busy ledgers")
+    args = ap.parse_args(argv)
+
+    for flag in ("start", "end"):
+        val = getattr(args, flag)
+        if val is None: continue
+        try:
+            if len(val) != 7: raise ValueError
+            setattr(args, flag, pd.Period(val, freq="M"))
+        except ValueError:
+            ap.error(f"--{flag} must be a month like 2024-01, got {val!r}")
+
+    df_t, df_c, df_b = load_snapshot(args.snapshot)
+    if df_t.empty and not (args.start and args.end):
+        ap.error("no transactions in snapshot; pass --start and --end")
+    start = args.start or df_t["Date"].min().to_period("M")
+    end = args.end or df_t["Date"].max().to_period("M")
+    months = [str(p) for p in pd.period_range(start, end, freq="M")]
+    if not months: ap.error(f"empty month range {start} .. {end}")
+
+    results = run_months(df_t, df_c, df_b, months, args.workers)
+    write_reports(build_reports(results), args.out, args.format)
+
+if __name__ == "__main__":
+    main()